@@ -18,7 +18,56 @@
 Various auxiliary methods.
 """
 
-from collections import OrderedDict
+# Number of weekdays and weekend days in each month; these never change, so we
+# build them once at import instead of on every call
+_MONTH_WEEKDAYS = {
+    1: 31.0 * 5.0/7.0,
+    2: 28.25 * 5.0/7.0,
+    3: 31.0 * 5.0/7.0,
+    4: 30.0 * 5.0/7.0,
+    5: 31.0 * 5.0/7.0,
+    6: 30.0 * 5.0/7.0,
+    7: 31.0 * 5.0/7.0,
+    8: 31.0 * 5.0/7.0,
+    9: 30.0 * 5.0/7.0,
+    10: 31.0 * 5.0/7.0,
+    11: 30.0 * 5.0/7.0,
+    12: 31.0 * 5.0/7.0
+}
+
+_MONTH_WEEKENDS = {
+    1: 31.0 * 2.0/7.0,
+    2: 28.25 * 2.0/7.0,
+    3: 31.0 * 2.0/7.0,
+    4: 30.0 * 2.0/7.0,
+    5: 31.0 * 2.0/7.0,
+    6: 30.0 * 2.0/7.0,
+    7: 31.0 * 2.0/7.0,
+    8: 31.0 * 2.0/7.0,
+    9: 30.0 * 2.0/7.0,
+    10: 31.0 * 2.0/7.0,
+    11: 30.0 * 2.0/7.0,
+    12: 31.0 * 2.0/7.0
+}
+
+
+def _make_month_to_day_conversion_factors():
+    """
+    Reciprocal of the number of days by month and day type, so that
+    monthly-to-daily conversion is a single lookup.
+    :return:
+    """
+    conversion_factors = dict()
+    for month in _MONTH_WEEKDAYS.keys():
+        conversion_factors[(month, "weekday")] = 1/_MONTH_WEEKDAYS[month]
+        conversion_factors[(month, "weekend")] = 1/_MONTH_WEEKENDS[month]
+        conversion_factors[(month, "total")] = \
+            1/(_MONTH_WEEKDAYS[month] + _MONTH_WEEKENDS[month])
+
+    return conversion_factors
+
+
+_MONTH_TO_DAY_CONVERSION_FACTORS = _make_month_to_day_conversion_factors()
 
 
 def get_month_weekdays():
@@ -26,22 +75,7 @@ def get_month_weekdays():
     Number of weekdays in each month.
     :return:
     """
-    month_weekdays = OrderedDict(
-        [(1, 31.0 * 5.0/7.0),
-         (2, 28.25 * 5.0/7.0),
-         (3, 31.0 * 5.0/7.0),
-         (4, 30.0 * 5.0/7.0),
-         (5, 31.0 * 5.0/7.0),
-         (6, 30.0 * 5.0/7.0),
-         (7, 31.0 * 5.0/7.0),
-         (8, 31.0 * 5.0/7.0),
-         (9, 30.0 * 5.0/7.0),
-         (10, 31.0 * 5.0/7.0),
-         (11, 30.0 * 5.0/7.0),
-         (12, 31.0 * 5.0/7.0)]
-    )
-
-    return month_weekdays
+    return _MONTH_WEEKDAYS
 
 
 def get_month_weekends():
@@ -49,39 +83,20 @@ def get_month_weekends():
     Number of weekend days in each month.
     :return:
     """
-    month_weekends = OrderedDict(
-        [(1, 31.0 * 2.0/7.0),
-         (2, 28.25 * 2.0/7.0),
-         (3, 31.0 * 2.0/7.0),
-         (4, 30.0 * 2.0/7.0),
-         (5, 31.0 * 2.0/7.0),
-         (6, 30.0 * 2.0/7.0),
-         (7, 31.0 * 2.0/7.0),
-         (8, 31.0 * 2.0/7.0),
-         (9, 30.0 * 2.0/7.0),
-         (10, 31.0 * 2.0/7.0),
-         (11, 30.0 * 2.0/7.0),
-         (12, 31.0 * 2.0/7.0)]
-    )
-
-    return month_weekends
+    return _MONTH_WEEKENDS
 
 
 def get_units(record):
     """
-    Determine units used in a record's energyratestructure.
+    Determine units used in a record's energyratestructure. Units are
+    yielded one tier at a time so that callers can stop early.
     :param record:
     :return:
     """
-    units = list()
     for rate_period in record["energyratestructure"]:
         for tier in rate_period:
-            if "max" in tier.keys() and "unit" in tier.keys():
-                units.append(tier["unit"].encode("utf-8"))
-            elif "max" in tier.keys() and "unit" not in tier.keys():
-                units.append("no units specified!")
-
-    return units
+            if "max" in tier:
+                yield tier.get("unit", "no units specified!")
 
 
 def check_if_monthly_tiers(record):
@@ -91,18 +106,26 @@ def check_if_monthly_tiers(record):
     :param record:
     :return:
     """
-    units = get_units(record=record)
-
-    if all(u == 'kWh' for u in units):
-        return True
-    elif all(u == 'kWh daily' for u in units):
-        return False
-    else:
-        raise ValueError(
-            "Can only allow 'kWh' and 'kWh daily' units. Check why "
-            "different units for record {} were not "
-            "filtered out.".format(record["label"])
-        )
+    # Walk the tiers once and stop at the first unit that is not allowed or
+    # doesn't match the one we have already seen
+    seen_unit = None
+    for rate_period in record["energyratestructure"]:
+        for tier in rate_period:
+            if "max" in tier:
+                unit = tier.get("unit", "no units specified!")
+                if unit == seen_unit:
+                    pass
+                elif seen_unit is None and unit in ('kWh', 'kWh daily'):
+                    seen_unit = unit
+                else:
+                    raise ValueError(
+                        "Can only allow 'kWh' and 'kWh daily' units. Check "
+                        "why different units for record {} were not "
+                        "filtered out.".format(record["label"])
+                    )
+
+    # Records without tier maximums are treated as monthly
+    return seen_unit != 'kWh daily'
 
 
 def convert_monthly_to_daily(month, day_type):
@@ -114,13 +137,6 @@ def convert_monthly_to_daily(month, day_type):
     :return:
     """
 
-    # Convert monthly to daily values
-    if day_type == 'weekday':
-        month_to_day_conversion_factor = 1/get_month_weekdays()[month]
-    elif day_type == "weekend":
-        month_to_day_conversion_factor = 1/get_month_weekends()[month]
-    else:
-        month_to_day_conversion_factor = \
-            1/(get_month_weekdays()[month] + get_month_weekends()[month])
-
-    return month_to_day_conversion_factor
+    # Any day type other than 'weekday' or 'weekend' covers the whole month
+    return _MONTH_TO_DAY_CONVERSION_FACTORS.get((month, day_type)) \
+        or _MONTH_TO_DAY_CONVERSION_FACTORS[(month, "total")]
@@ -42,17 +42,30 @@ from auxiliary import check_if_monthly_tiers, \
     convert_monthly_to_daily, get_month_weekends, get_month_weekdays
 
 
+# Consumption aggregated by aggregate_consumption, keyed by the weekday and
+# weekend schedules, along with the profiles it was aggregated from
+_CONSUMPTION_CACHE_SIZE = 1024
+_consumption_cache = {"profiles": None, "by_schedule": dict()}
+
+
 def derive_params(record, month):
     """
-    Calculate a few parameters for use elsewhere.
+    Calculate a few parameters for use elsewhere. Both the tier structure
+    filter and process_record need these, so they are cached on the record
+    the first time they are calculated for a month.
     :param record:
     :param month:
     :return:
     """
+    if "_derived_params" not in record:
+        record["_derived_params"] = dict()
+    elif month in record["_derived_params"]:
+        return record["_derived_params"][month]
+
     weekday_rate_periods = set(record["energyweekdayschedule"][month - 1])
     weekend_rate_periods = set(record["energyweekendschedule"][month - 1])
 
-    rate_periods = set(weekday_rate_periods | weekend_rate_periods)
+    rate_periods = weekday_rate_periods | weekend_rate_periods
     lowest_rate_period_n = min(rate_periods)
 
     number_of_tiers_by_rate_period = {
@@ -60,14 +73,14 @@ def derive_params(record, month):
         for rate_period in rate_periods
     }
 
-    max_num_tiers = max(
-        len(record["energyratestructure"][rate_period])
-        for rate_period in rate_periods
-    )
+    max_num_tiers = max(number_of_tiers_by_rate_period.values())
 
-    return rate_periods, lowest_rate_period_n, \
+    record["_derived_params"][month] = \
+        rate_periods, lowest_rate_period_n, \
         number_of_tiers_by_rate_period, max_num_tiers
 
+    return record["_derived_params"][month]
+
 
 def check_tier_structure(record, month):
     """
@@ -112,8 +125,7 @@ def check_tier_structure(record, month):
                 pass
             # If there is a max, add the number to a dictionary of tier
             # maxes for each rate period
-            elif "max" \
-                    in record["energyratestructure"][rate_period][tier].keys():
+            elif "max" in record["energyratestructure"][rate_period][tier]:
                 rate_period_tier_max[rate_period] = \
                     record["energyratestructure"][rate_period][tier]["max"]
             else:
@@ -130,194 +142,152 @@ def check_tier_structure(record, month):
     return True
 
 
-def make_db_tables(
-        record, db,
+def aggregate_consumption(
+        record,
         baseline_weekday_profile, baseline_weekend_profile,
         charging_weekday_profile, charging_weekend_profile
 ):
     """
-    Make database tables from the baseline and EV charging profiles.
+    Aggregate the baseline and EV charging profiles to kWh by day type,
+    month, and rate period. Weekday and weekend consumption are also
+    combined into a 'total' day type.
     :param record:
-    :param db:
     :param baseline_weekday_profile:
     :param baseline_weekend_profile:
     :param charging_weekday_profile:
     :param charging_weekend_profile:
-    :return:
+    :return: dictionary with day types as keys and dictionaries of
+    [baseline_kwh, ev_charging_kwh] by rate period by month as values
     """
-    c = db.cursor()
-
-    # ### Make tables of weekday/weekend rate_period by month/hour ### #
-    for day_type in ["day", "end"]:
-        c.execute(
-            """DROP TABLE IF EXISTS week{}_profiles;""".format(day_type)
-        )
-        c.execute(
-            """CREATE TABLE week{}_profiles (
-            month_of_year INTEGER,
-            hour_of_day INTEGER,
-            number_week{}_days_in_month FLOAT,
-            rate_period INTEGER,
-            baseline_kw FLOAT,
-            ev_charging_kw FLOAT,
-            PRIMARY KEY (month_of_year, hour_of_day)
-            );""".format(day_type, day_type)
-        )
-
+    # Many records share the same schedules (e.g. all flat rates), so reuse
+    # the consumption we aggregated for an earlier record with the same
+    # schedules as long as the profiles are the same
+    profiles = [baseline_weekday_profile, baseline_weekend_profile,
+                charging_weekday_profile, charging_weekend_profile]
+    if _consumption_cache["profiles"] != profiles \
+            or len(_consumption_cache["by_schedule"]) \
+            >= _CONSUMPTION_CACHE_SIZE:
+        _consumption_cache["by_schedule"] = dict()
+    _consumption_cache["profiles"] = profiles
+
+    schedules = (
+        tuple(tuple(month) for month in record["energyweekdayschedule"]),
+        tuple(tuple(month) for month in record["energyweekendschedule"])
+    )
+    if schedules in _consumption_cache["by_schedule"]:
+        return _consumption_cache["by_schedule"][schedules]
+
+    consumption = {"weekday": dict(), "weekend": dict(), "total": dict()}
+
+    # ### Aggregate weekday/weekend consumption to month-rate_period ### #
+    for day_type, schedule, days_in_month, \
+            baseline_profile, charging_profile in [
+                ("weekday", record["energyweekdayschedule"],
+                 get_month_weekdays(),
+                 baseline_weekday_profile, charging_weekday_profile),
+                ("weekend", record["energyweekendschedule"],
+                 get_month_weekends(),
+                 baseline_weekend_profile, charging_weekend_profile)
+            ]:
         for month in range(1, 13):
             month_index = month - 1  # index in energyweek*schedule
+            consumption_by_rate_period = dict()
             for hour in range(0, 24):
                 # index in energyratestructure
-                if day_type == 'day':
-                    rate_period_index = \
-                        record["energyweekdayschedule"][month_index][hour]
-                else:
-                    rate_period_index = \
-                        record["energyweekendschedule"][month_index][hour]
-                c.execute(
-                    """INSERT INTO week{}_profiles
-                    (month_of_year, hour_of_day, number_week{}_days_in_month,
-                    rate_period, baseline_kw, ev_charging_kw)
-                    VALUES ({}, {}, {}, {}, {}, {});""".format(
-                        day_type, day_type,
-                        month, hour,
-                        get_month_weekdays()[month] if day_type == 'day' else
-                        get_month_weekends()[month],
-                        rate_period_index,
-                        baseline_weekday_profile[month][hour]
-                        if day_type == 'day'
-                        else baseline_weekend_profile[month][hour],
-                        charging_weekday_profile[month][hour]
-                        if day_type == 'day'
-                        else charging_weekend_profile[month][hour]
-                    )
-                )
+                rate_period = schedule[month_index][hour]
+                if rate_period not in consumption_by_rate_period:
+                    consumption_by_rate_period[rate_period] = [0, 0]
+                consumption_by_rate_period[rate_period][0] += \
+                    baseline_profile[month][hour] * days_in_month[month]
+                consumption_by_rate_period[rate_period][1] += \
+                    charging_profile[month][hour] * days_in_month[month]
+            consumption[day_type][month] = consumption_by_rate_period
 
-    # ### Aggregate to month-rate_period ### #
-        c.execute(
-            """DROP TABLE IF EXISTS 
-            week{}_consumption_by_month_rate_period;""".format(day_type)
-        )
+    # ### Combine weekday and weekend consumption by rate_period ### #
+    for month in range(1, 13):
+        consumption_by_rate_period = dict()
+        for day_type in ["weekday", "weekend"]:
+            for rate_period, (baseline_kwh, ev_charging_kwh) in \
+                    consumption[day_type][month].items():
+                if rate_period not in consumption_by_rate_period:
+                    consumption_by_rate_period[rate_period] = [0, 0]
+                consumption_by_rate_period[rate_period][0] += baseline_kwh
+                consumption_by_rate_period[rate_period][1] += ev_charging_kwh
+        consumption["total"][month] = consumption_by_rate_period
 
-        c.execute(
-            """CREATE TABLE week{}_consumption_by_month_rate_period (
-            month_of_year INTEGER,
-            rate_period INTEGER,
-            total_hours FLOAT,
-            baseline_kwh FLOAT,
-            ev_charging_kwh FLOAT,
-            PRIMARY KEY (month_of_year, rate_period)
-            );""".format(day_type)
-        )
+    _consumption_cache["by_schedule"][schedules] = consumption
 
-        c.execute(
-            """INSERT INTO week{}_consumption_by_month_rate_period
-            (month_of_year, rate_period, total_hours, baseline_kwh,
-            ev_charging_kwh)
-            SELECT month_of_year, rate_period, 
-            sum(number_week{}_days_in_month),
-            sum(baseline_kw*number_week{}_days_in_month), 
-            sum(ev_charging_kw*number_week{}_days_in_month)
-            FROM week{}_profiles
-            GROUP BY month_of_year, rate_period;""".format(
-                day_type, day_type, day_type, day_type, day_type
-            )
-        )
+    return consumption
 
-        db.commit()
 
-    # ### Combine weekday and weekend consumption by rate_period ### #
-    c.execute(
-        """DROP TABLE IF EXISTS total_consumption_by_month_rate_period;"""
-    )
-    c.execute(
-        """CREATE TABLE total_consumption_by_month_rate_period (
-            month_of_year INTEGER,
-            rate_period INTEGER,
-            weekday_hours FLOAT,
-            weekend_hours FLOAT,
-            total_hours FLOAT,
-            weekday_baseline_kwh FLOAT,
-            weekend_baseline_kwh FLOAT,
-            total_baseline_kwh FLOAT,
-            weekday_ev_charging_kwh FLOAT,
-            weekend_ev_charging_kwh FLOAT,
-            total_ev_charging_kwh FLOAT,
-            PRIMARY KEY (month_of_year, rate_period)
-            );"""
-    )
+def calculate_daily_charging_cost(
+        tier_maximums_kwh_daily, tier_rates,
+        daily_baseline_kwh, daily_ev_charging_kwh
+):
+    """
+    Allocate the daily EV charging to tiers on top of the daily baseline
+    consumption and apply each tier's rate.
+    :param tier_maximums_kwh_daily: dictionary of daily tier maximums by
+    tier; None if the tier has no maximum
+    :param tier_rates: dictionary of rates by tier
+    :param daily_baseline_kwh:
+    :param daily_ev_charging_kwh:
+    :return:
+    """
+    # We'll need to track how many kWh we have left to charge
+    # Start with the total daily charging consumption
+    remaining_ev_charging_kwh = daily_ev_charging_kwh
 
-    # Add weekdays
-    c.execute(
-        """INSERT INTO total_consumption_by_month_rate_period
-        (month_of_year, rate_period, weekday_hours, weekday_baseline_kwh, 
-        weekday_ev_charging_kwh)
-        SELECT month_of_year, rate_period, total_hours, baseline_kwh, 
-        ev_charging_kwh
-        FROM weekday_consumption_by_month_rate_period;"""
-        )
+    # Charging cost starts at 0
+    daily_charging_cost = 0
 
-    # Add weekends
-    c.execute(
-        """INSERT OR IGNORE INTO total_consumption_by_month_rate_period
-        (month_of_year, rate_period)
-        SELECT month_of_year, rate_period
-        FROM weekend_consumption_by_month_rate_period;"""
-    )
-    db.commit()
-
-    weekend_month_rate_period = c.execute(
-        """SELECT month_of_year, rate_period
-        FROM weekend_consumption_by_month_rate_period;"""
-    ).fetchall()
-
-    for m, rp in weekend_month_rate_period:
-        h, b, e = c.execute(
-            """SELECT total_hours, baseline_kwh, ev_charging_kwh
-            FROM weekend_consumption_by_month_rate_period
-            WHERE month_of_year = {}
-            AND rate_period = {};""".format(m, rp)
-        ).fetchall()[0]
-
-        c.execute(
-            """UPDATE total_consumption_by_month_rate_period
-            SET weekend_hours = {},
-            weekend_baseline_kwh = {},
-            weekend_ev_charging_kwh = {}
-            WHERE month_of_year = {}
-            AND rate_period = {};""".format(
-                h, b, e, m, rp
-            )
-        )
-    db.commit()
-
-    # NULLs to zeros
-    for column in [
-        "weekday_hours", "weekend_hours",
-        "weekday_baseline_kwh", "weekend_baseline_kwh",
-        "weekday_ev_charging_kwh", "weekend_ev_charging_kwh"
-    ]:
-        c.execute(
-            """UPDATE total_consumption_by_month_rate_period
-            SET {} = 0
-            WHERE {} IS NULL;""".format(
-                column, column
-            )
-        )
+    for tier, tier_max_kwh_daily in tier_maximums_kwh_daily.items():
+        # If there's a max for this tier, figure out if we have consumed
+        # enough to go to the next tier or if we need to calculate EV
+        # charging cost in this tier
+        if tier_max_kwh_daily is not None:
+            # If the daily baseline consumption is
+            # more than the max for this tier, we'll move to the next
+            # tier without applying this tier's rate to any of the EV
+            # charging kWh
+            if daily_baseline_kwh > tier_max_kwh_daily:
+                pass
 
-    # Get totals
-    c.execute(
-        """UPDATE total_consumption_by_month_rate_period
-        SET total_hours = weekday_hours + weekend_hours,
-        total_baseline_kwh = weekday_baseline_kwh + weekend_baseline_kwh,
-        total_ev_charging_kwh = weekday_ev_charging_kwh + 
-        weekend_ev_charging_kwh;"""
-    )
-    db.commit()
+            # If remaining EV charging kWh is less than the difference
+            # between the daily max and and the baseline consumption,
+            # this tier rate is applied to any remaining EV charging kWh
+            elif remaining_ev_charging_kwh < \
+                    tier_max_kwh_daily - daily_baseline_kwh:
+                daily_charging_cost += \
+                    remaining_ev_charging_kwh * tier_rates[tier]
+                # No EV charging left to do
+                break
+
+            # Otherwise, we'll apply this tier's rates to the remaining
+            # kWh within this tier, subtract that from remaining EV
+            # charging kWh, and move on to the next tier
+            else:
+                daily_charging_cost += \
+                    (tier_max_kwh_daily - daily_baseline_kwh) \
+                    * tier_rates[tier]
+                # Subtract the amount we charged in this tier from the
+                # remaining charging
+                remaining_ev_charging_kwh -= \
+                    (tier_max_kwh_daily - daily_baseline_kwh)
+        # If no max for the tier, apply the tier rate to any remaining
+        # EV charging kWh
+        else:
+            daily_charging_cost += \
+                remaining_ev_charging_kwh * tier_rates[tier]
+            # No EV charging left to do
+            break
+
+    return daily_charging_cost
 
 
 def calculate_monthly_cost(
-        record, month, day_type, tier_maximums, db, ev_specific
+        record, month, day_type, tier_maximums, rates, consumption,
+        ev_specific
 ):
     """
     Calculate the cost to charge an EV based on pre-specified baseline and
@@ -358,38 +328,13 @@ def calculate_monthly_cost(
     :param month:
     :param day_type:
     :param tier_maximums:
-    :param db:
+    :param rates:
+    :param consumption:
     :param ev_specific:
     :return:
     """
-    c = db.cursor()
     month_index = month - 1
 
-    # Get the baseline and EV consumption for the month
-    # If this is an EV-specific rate, the baseline consumption is 0
-    monthly_baseline_kwh = c.execute(
-        """SELECT sum({}_baseline_kwh)
-        FROM total_consumption_by_month_rate_period
-        WHERE month_of_year = {}
-        GROUP BY month_of_year;""".format(
-            day_type, month
-        )
-    ).fetchall()[0][0] if not ev_specific else 0
-
-    monthly_ev_charging_kwh = c.execute(
-        """SELECT sum({}_ev_charging_kwh)
-        FROM total_consumption_by_month_rate_period
-        WHERE month_of_year = {}
-        GROUP BY month_of_year""".format(
-            day_type, month
-        )
-    ).fetchall()[0][0]
-
-    daily_baseline_kwh = \
-        monthly_baseline_kwh * convert_monthly_to_daily(month, day_type)
-    daily_ev_charging_kwh = \
-        monthly_ev_charging_kwh * convert_monthly_to_daily(month, day_type)
-
     # Figure out which rate periods are in this month
     if day_type == 'weekday':
         rate_periods = record["energyweekdayschedule"][month_index]
@@ -402,53 +347,66 @@ def calculate_monthly_cost(
     else:
         raise ValueError("Day types can be 'weekday,' 'weekend,' and 'total.'")
 
+    # Get the baseline and EV consumption for the month by rate period
+    consumption_by_rate_period = consumption[day_type][month]
+
+    # If this is an EV-specific rate, the baseline consumption is 0
+    monthly_baseline_kwh = sum(
+        baseline_kwh
+        for baseline_kwh, _ in consumption_by_rate_period.values()
+    ) if not ev_specific else 0
+
+    monthly_ev_charging_kwh = sum(
+        ev_charging_kwh
+        for _, ev_charging_kwh in consumption_by_rate_period.values()
+    )
+
+    daily_baseline_kwh = \
+        monthly_baseline_kwh * convert_monthly_to_daily(month, day_type)
+    daily_ev_charging_kwh = \
+        monthly_ev_charging_kwh * convert_monthly_to_daily(month, day_type)
+
     # For each tier, we'll loop through the rate_periods to apply the
     # appropriate rate, so we need to know how much of the consumption in
     # the tier is in each period; we'll figure that out by getting the
     # relative EV consumption in each period: weights for each period that
     # sum up to 1 for the  month/day_type
-    rate_period_weights = {}
-    for rate_period in set(rate_periods):
-        ev_charging_kwh_at_rate_period = c.execute(
-            """SELECT sum({}_ev_charging_kwh)
-                FROM total_consumption_by_month_rate_period
-                WHERE month_of_year = {}
-                AND rate_period = {}
-                GROUP BY month_of_year;""".format(
-                day_type, month, rate_period
-            )
-        ).fetchall()[0][0]
-        rate_period_weights[rate_period] = \
-            ev_charging_kwh_at_rate_period/monthly_ev_charging_kwh
-
-    # ### CALCULATION LOOP ### #
-    # Loop through tiers and rate periods for each tier to figure out charging
-    # and cost in each tier
-
-    # We'll need to track how many kWh we have left to charge
-    # Start with the total daily charging consumption
-    remaining_ev_charging_kwh = daily_ev_charging_kwh
+    rate_period_weights = {
+        rate_period: ev_charging_kwh/monthly_ev_charging_kwh
+        for rate_period, (_, ev_charging_kwh)
+        in consumption_by_rate_period.items()
+    }
 
-    # Charging cost starts at 0
-    daily_charging_cost = 0
+    # The rate of each period is applied to the share of the tier's
+    # consumption in that period, so each tier has a single rate weighted
+    # across the periods
+    unique_rate_periods = set(rate_periods)
+    tier_rates = {
+        tier: sum(
+            rate_period_weights[rate_period] * rates[rate_period][tier]
+            for rate_period in unique_rate_periods
+        )
+        for tier in tier_maximums.keys()
+    }
 
+    # Convert the tier maximums to daily kWh
+    tier_maximums_kwh_daily = dict()
     for tier in tier_maximums.keys():
-        # If there's a max for this tier, figure out if we have consumed
-        # enough to go to the next tier or if we need to calculate EV
-        # charging cost in this tier
-        if tier_maximums[tier] is not None:
+        if tier_maximums[tier] is None:
+            tier_maximums_kwh_daily[tier] = None
+        else:
             # We have checked that the tier maxes are the same for all rate
             # periods, so can just pick the first one here
             tier_max_unit = record["energyratestructure"][rate_periods[0]][
-                    tier]["unit"].encode("utf-8")
+                    tier]["unit"]
 
             # # Convert monthly to daily if needed
             if tier_max_unit == 'kWh':
-                tier_max_kwh_daily = \
+                tier_maximums_kwh_daily[tier] = \
                     tier_maximums[tier] \
                     * convert_monthly_to_daily(month, day_type)
             elif tier_max_unit == "kWh daily":
-                tier_max_kwh_daily = \
+                tier_maximums_kwh_daily[tier] = \
                     tier_maximums[tier]
             else:
                 raise ValueError(
@@ -456,68 +414,13 @@ def calculate_monthly_cost(
                     "different units for record {}, month {} were not "
                     "filtered out.".format(record["label"], month)
                 )
-            # If the daily baseline consumption is
-            # more than the max for this tier, we'll move to the next
-            # tier without applying this tier's rate to any of the EV
-            # charging kWh
-            if daily_baseline_kwh > tier_max_kwh_daily:
-                pass
 
-            # If remaining EV charging kWh is less than the difference
-            # between the daily max and and the baseline consumption,
-            # this tier rate is applied to any remaining EV charging kWh
-            # Loop through all the periods and apply the appropriate period
-            # rate for this tier
-            elif remaining_ev_charging_kwh < \
-                    tier_max_kwh_daily - daily_baseline_kwh:
-                for rate_period in set(rate_periods):
-                    daily_charging_cost += \
-                        remaining_ev_charging_kwh \
-                        * rate_period_weights[rate_period] \
-                        * (record["energyratestructure"][rate_period][tier][
-                            "rate"]
-                            + (record["energyratestructure"][rate_period][tier
-                               ]["adj"]
-                                if "adj" in record["energyratestructure"][
-                                rate_period][tier].keys() else 0)
-                           )
-                # No EV charging left to do
-                remaining_ev_charging_kwh = 0
-
-            # Otherwise, we'll apply this tier's rates to the remaining
-            # kWh within this tier, subtract that from remaining EV
-            # charging kWh, and move on to the next tier
-            else:
-                for rate_period in set(rate_periods):
-                    daily_charging_cost += \
-                        (tier_max_kwh_daily - daily_baseline_kwh) \
-                        * rate_period_weights[rate_period] \
-                        * (record["energyratestructure"][rate_period][tier][
-                            "rate"]
-                            + (record["energyratestructure"][rate_period][tier
-                               ]["adj"]
-                                if "adj" in record["energyratestructure"][
-                                rate_period][tier].keys() else 0)
-                           )
-                # Subtract the amount we charged in this tier from the
-                # remaining charging
-                remaining_ev_charging_kwh -= \
-                    (tier_max_kwh_daily - daily_baseline_kwh)
-        # If no max for the tier, apply the tier rate to any remaining
-        # EV charging kWh
-        else:
-            for rate_period in set(rate_periods):
-                daily_charging_cost += \
-                    remaining_ev_charging_kwh \
-                    * rate_period_weights[rate_period] \
-                    * (record["energyratestructure"][rate_period][tier][
-                        "rate"]
-                        + (record["energyratestructure"][rate_period][tier][
-                               "adj"]
-                            if "adj" in record["energyratestructure"][
-                            rate_period][tier].keys() else 0)
-                       )
-            remaining_ev_charging_kwh = 0
+    daily_charging_cost = calculate_daily_charging_cost(
+        tier_maximums_kwh_daily=tier_maximums_kwh_daily,
+        tier_rates=tier_rates,
+        daily_baseline_kwh=daily_baseline_kwh,
+        daily_ev_charging_kwh=daily_ev_charging_kwh
+    )
 
     # Convert daily cost to monthly cost
     monthly_charging_cost = \
@@ -528,7 +431,7 @@ def calculate_monthly_cost(
 
 
 def process_record(
-        record, db,
+        record,
         baseline_weekday_profile, baseline_weekend_profile,
         charging_weekday_profile, charging_weekend_profile,
         ev_specific
@@ -536,7 +439,6 @@ def process_record(
     """
 
     :param record:
-    :param db:
     :param baseline_weekday_profile:
     :param baseline_weekend_profile:
     :param charging_weekday_profile:
@@ -544,12 +446,19 @@ def process_record(
     :param ev_specific:
     :return:
     """
-    make_db_tables(record=record, db=db,
-                   baseline_weekday_profile=baseline_weekday_profile,
-                   baseline_weekend_profile=baseline_weekend_profile,
-                   charging_weekday_profile=charging_weekday_profile,
-                   charging_weekend_profile=charging_weekend_profile
-                   )
+    consumption = aggregate_consumption(
+        record=record,
+        baseline_weekday_profile=baseline_weekday_profile,
+        baseline_weekend_profile=baseline_weekend_profile,
+        charging_weekday_profile=charging_weekday_profile,
+        charging_weekend_profile=charging_weekend_profile
+    )
+
+    # Rates (including any adjustment) by rate period and tier
+    rates = [
+        [tier["rate"] + tier.get("adj", 0) for tier in rate_period]
+        for rate_period in record["energyratestructure"]
+    ]
 
     # We'll use the totals if we have a monthly tier structure and separate
     # by weekday/weekend if we have a daily tier structure
@@ -558,26 +467,22 @@ def process_record(
 
     annual_charging_cost = 0
     for month in range(1, 13):
-        lowest_rate_period_n, max_num_tiers = \
-            derive_params(record=record, month=month)[1], \
-            derive_params(record=record, month=month)[3]
-        for day_type in day_types:
-            tier_maximums = {
-                tier_index:
-                    record["energyratestructure"][lowest_rate_period_n][
-                        tier_index]["max"]
-                    if "max" in
-                       record["energyratestructure"][lowest_rate_period_n][
-                           tier_index].keys()
-                    else None
-                for tier_index in range(0, max_num_tiers)
-            }
+        _, lowest_rate_period_n, _, max_num_tiers = \
+            derive_params(record=record, month=month)
+        lowest_rate_period_tiers = \
+            record["energyratestructure"][lowest_rate_period_n]
+        tier_maximums = {
+            tier_index: lowest_rate_period_tiers[tier_index].get("max")
+            for tier_index in range(0, max_num_tiers)
+        }
 
+        for day_type in day_types:
             annual_charging_cost += calculate_monthly_cost(
                 record=record, month=month,
                 day_type=day_type,
                 tier_maximums=tier_maximums,
-                db=db,
+                rates=rates,
+                consumption=consumption,
                 ev_specific=ev_specific
             )
     return annual_charging_cost
@@ -28,7 +28,19 @@ Include your API key in a file named 'api_key.txt' in the 'settings' directory.
 """
 
 import requests
-import json
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+# Reuse one connection to the API across pages and retry transient errors
+_SESSION = requests.Session()
+_SESSION.mount(
+    "https://",
+    HTTPAdapter(max_retries=Retry(
+        total=5, backoff_factor=0.5,
+        status_forcelist=[429, 500, 502, 503, 504]
+    ))
+)
 
 
 def request_records(request_params):
@@ -39,13 +51,13 @@ def request_records(request_params):
     keys and the parameter values
     :return:
     """
-    records = requests.get(
+    records = _SESSION.get(
         "https://api.openei.org/utility_rates?", params=request_params
     )
-    request_content = records.content
+    records.raise_for_status()
 
     # strict=False prevents an error (control characters are allowed inside
     # strings)
-    json_records = json.loads(request_content, strict=False)
+    json_records = records.json(strict=False)
 
     return json_records
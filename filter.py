@@ -20,6 +20,7 @@ Functions for excluding records based on various criteria.
 
 import csv
 import datetime
+from functools import lru_cache
 import os.path
 
 from auxiliary import get_units
@@ -34,7 +35,7 @@ def filter_by_energy_structure(record):
     :param record:
     :return:
     """
-    if "energyratestructure" not in record.keys():
+    if "energyratestructure" not in record:
         return True
     else:
         return False
@@ -48,7 +49,7 @@ def filter_by_end_date(record):
     :param record:
     :return:
     """
-    if "enddate" in record.keys():
+    if "enddate" in record:
         if int(record["enddate"]) < 0:
             return True
         elif datetime.datetime.fromtimestamp(record["enddate"]) \
@@ -60,16 +61,13 @@ def filter_by_end_date(record):
         return False
 
 
-def filter_by_keyword(record):
+@lru_cache(maxsize=None)
+def get_filter_keywords():
     """
-    Exclude records containing certain keywords in the name.
-    True: filter out
-    False: keep
-    :param record:
+    Get the keywords for filtering records by name, lower-cased for case
+    insensitive matching. The keywords file is only read on the first call.
     :return:
     """
-    name = record["name"].encode("utf-8")
-
     keyword_list = list()
     with open(os.path.join(os.getcwd(), "settings",
                            "keywords_for_filtering.csv"
@@ -78,12 +76,23 @@ def filter_by_keyword(record):
         for item in reader:
             keyword_list += item
 
-        if any(keyword.lower() in name.decode('utf8').lower() for
-               keyword
-               in keyword_list):  # case insensitive
-            return True
-        else:
-            return False
+    return tuple(keyword.lower() for keyword in keyword_list)
+
+
+def filter_by_keyword(record):
+    """
+    Exclude records containing certain keywords in the name.
+    True: filter out
+    False: keep
+    :param record:
+    :return:
+    """
+    name = record["name"].lower()  # case insensitive
+
+    if any(keyword in name for keyword in get_filter_keywords()):
+        return True
+    else:
+        return False
 
 
 def filter_by_units(record):
@@ -94,8 +103,7 @@ def filter_by_units(record):
     :param record:
     :return:
     """
-    units = get_units(record=record)
-    if all(u == 'kWh' or u == 'kWh daily' for u in units):
+    if all(u == 'kWh' or u == 'kWh daily' for u in get_units(record=record)):
         return False
     else:
         return True
@@ -109,7 +117,7 @@ def filter_for_missing_rates(record):
     """
     for period in record["energyratestructure"]:
         for tier in period:
-            if "rate" not in tier.keys():
+            if "rate" not in tier:
                 return True
 
     return False
@@ -138,16 +146,18 @@ def filter_record(record):
     :param record:
     :return:
     """
+    # Checks run cheapest first; the tier structure check goes through every
+    # month of the record, so it runs last
     if filter_by_energy_structure(record=record):
         return True, "missing energy structure"
     elif filter_by_end_date(record=record):
         return True, "end date"
-    elif filter_by_keyword(record=record):
-        return True, "keyword"
     elif filter_by_units(record=record):
         return True, "units"
     elif filter_for_missing_rates(record=record):
         return True, "missing rate"
+    elif filter_by_keyword(record=record):
+        return True, "keyword"
     elif filter_for_non_conforming_tier_structure(record=record):
         return True, "non-conforming tier structure"
     else:
@@ -20,15 +20,35 @@ filtered out.
 
 """
 import csv
-from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from multiprocessing import Pool
 import os.path
-import sqlite3
 
 from download import request_records
 from filter import filter_record
+from auxiliary import get_month_weekdays, get_month_weekends
 from calculate import process_record
 
 
+# Results files
+RESULTS_DIRECTORY = os.path.join(os.getcwd(), "results")
+CHARGING_COST_RESULTS_FILE = os.path.join(
+    RESULTS_DIRECTORY, "ev_charging_cost_by_utility_rate.csv"
+)
+FILTERED_RECORDS_RESULTS_FILE = os.path.join(
+    RESULTS_DIRECTORY, "filtered_records.csv"
+)
+
+# Record fields written to the results files, in column order; fields that a
+# record doesn't have are left empty
+FILTERED_RECORD_FIELDS = (
+    "label", "utility", "eiaid", "name", "description", "enddate", "source",
+    "uri"
+)
+CHARGING_COST_RECORD_FIELDS = FILTERED_RECORD_FIELDS + ("fixedmonthlycharge",)
+
+
 def get_request_params():
     """
     Get the parameters for the download request.
@@ -53,76 +73,112 @@ def get_request_params():
     return params
 
 
-def get_profile_inputs():
+def read_profile(file_name):
     """
-    Get the baseline and EV charging input files.
+    Read a profile input file with month, hour, weekday kW and weekend kW
+    columns. Each profile is a dictionary with months (1-12) as keys and
+    lists of the 24 hourly values as values, so values are looked up as
+    profile[month][hour].
+    :param file_name:
     :return:
     """
-    baseline_weekday = OrderedDict()
-    baseline_weekend = OrderedDict()
-    charging_weekday = OrderedDict()
-    charging_weekend = OrderedDict()
-
-    with open(
-            os.path.join(os.getcwd(), 'inputs', 'baseline_profile.csv'),
-            'r') as baseline_profile_file:
-        reader = csv.reader(baseline_profile_file)
+    # Hours missing from the input file stay None and will cause an error
+    # when used
+    weekday = {month: [None] * 24 for month in range(1, 13)}
+    weekend = {month: [None] * 24 for month in range(1, 13)}
+
+    with open(os.path.join(os.getcwd(), 'inputs', file_name),
+              'r') as profile_file:
+        reader = csv.reader(profile_file)
         next(reader)  # skip header
-        for row in reader:
-            if int(row[0]) not in baseline_weekday.keys():
-                baseline_weekday[int(row[0])] = OrderedDict()
-                baseline_weekend[int(row[0])] = OrderedDict()
+        for month, hour, weekday_kw, weekend_kw in reader:
+            month, hour = int(month), int(hour)
+            weekday[month][hour] = float(weekday_kw)
+            weekend[month][hour] = float(weekend_kw)
 
-            baseline_weekday[int(row[0])][int(row[1])] = float(row[2])
-            baseline_weekend[int(row[0])][int(row[1])] = float(row[3])
+    return weekday, weekend
 
-    with open(
-            os.path.join(os.getcwd(), 'inputs', 'charging_profile.csv'),
-            'r') as charging_profile_file:
-        reader = csv.reader(charging_profile_file)
-        next(reader)  # skip header
-        for row in reader:
-            if int(row[0]) not in charging_weekday.keys():
-                charging_weekday[int(row[0])] = OrderedDict()
-                charging_weekend[int(row[0])] = OrderedDict()
 
-            charging_weekday[int(row[0])][int(row[1])] = float(row[2])
-            charging_weekend[int(row[0])][int(row[1])] = float(row[3])
+def get_profile_inputs():
+    """
+    Get the baseline and EV charging input files.
+    :return:
+    """
+    baseline_weekday, baseline_weekend = \
+        read_profile(file_name='baseline_profile.csv')
+    charging_weekday, charging_weekend = \
+        read_profile(file_name='charging_profile.csv')
 
     return baseline_weekday, baseline_weekend, \
         charging_weekday, charging_weekend
 
 
-def calculate_annual_charging_kwh(database):
+def calculate_annual_charging_kwh(
+        charging_weekday_profile, charging_weekend_profile
+):
     """
     Calculate the annual charging kWh from the charging profile.
-    :param database:
+    :param charging_weekday_profile:
+    :param charging_weekend_profile:
     :return:
     """
+    month_weekdays = get_month_weekdays()
+    month_weekends = get_month_weekends()
 
-    c = database.cursor()
-    weekday_charging = c.execute(
-        """SELECT sum(ev_charging_kw * number_weekday_days_in_month)
-        FROM weekday_profiles;"""
-    ).fetchone()[0]
-    weekend_charging = c.execute(
-        """SELECT sum(ev_charging_kw * number_weekend_days_in_month)
-                FROM weekend_profiles;"""
-    ).fetchone()[0]
+    weekday_charging = sum(
+        charging_weekday_profile[month][hour] * month_weekdays[month]
+        for month in range(1, 13) for hour in range(0, 24)
+    )
+    weekend_charging = sum(
+        charging_weekend_profile[month][hour] * month_weekends[month]
+        for month in range(1, 13) for hour in range(0, 24)
+    )
     total_charging = weekday_charging + weekend_charging
 
     return total_charging
 
 
+def calculate_charging_cost(
+        record,
+        baseline_weekday_profile, baseline_weekend_profile,
+        charging_weekday_profile, charging_weekend_profile
+):
+    """
+    Check whether a record is an EV-specific rate and calculate its annual
+    EV charging cost. This is the task we hand to the worker processes.
+    :param record:
+    :param baseline_weekday_profile:
+    :param baseline_weekend_profile:
+    :param charging_weekday_profile:
+    :param charging_weekend_profile:
+    :return:
+    """
+    # Is this is an EV-specific rate ("EV" is matched case-sensitively so we
+    # don't pick up names like "Level" or "Seven")
+    name = record["name"]
+    ev_specific = "EV" in name or "electric vehicle" in name.lower()
+
+    # Calculate charging cost
+    annual_charging_cost = process_record(
+        record=record,
+        baseline_weekday_profile=baseline_weekday_profile,
+        baseline_weekend_profile=baseline_weekend_profile,
+        charging_weekday_profile=charging_weekday_profile,
+        charging_weekend_profile=charging_weekend_profile,
+        ev_specific=ev_specific
+    )
+
+    return ev_specific, annual_charging_cost
+
+
 def write_results_files_headers():
     """
     Write the headers of the EV charging cost and filtered records results
     files.
     :return:
     """
-    with open(os.path.join(
-            os.getcwd(), "results", "ev_charging_cost_by_utility_rate.csv"
-    ), "w", newline="") as results_file:
+    with open(CHARGING_COST_RESULTS_FILE, "w", newline="",
+              encoding="utf-8") as results_file:
         charging_cost_writer = csv.writer(results_file, delimiter=",")
         # Write header
         charging_cost_writer.writerow(
@@ -133,9 +189,8 @@ def write_results_files_headers():
              "ev_annual_charging_kwh", "ev_specific_rate"]
         )
 
-    with open(os.path.join(
-            os.getcwd(), "results", "filtered_records.csv"
-    ), "w", newline="") as results_file:
+    with open(FILTERED_RECORDS_RESULTS_FILE, "w", newline="",
+              encoding="utf-8") as results_file:
         filter_writer = csv.writer(results_file, delimiter=",")
         # Write header
         filter_writer.writerow(
@@ -144,68 +199,37 @@ def write_results_files_headers():
         )
 
 
-def write_charging_cost_results(
+def get_charging_cost_results_row(
         record, calculated_annual_charging_cost,
-        calculated_annual_charging_kwh, ev_specific_rate,
-        csv_writer
+        calculated_annual_charging_kwh, ev_specific_rate
 ):
     """
-    Write the charging cost results for a record.
+    Get the charging cost results row for a record.
     :param record:
     :param calculated_annual_charging_cost:
     :param calculated_annual_charging_kwh:
     :param ev_specific_rate:
-    :param csv_writer:
     :return:
     """
-    csv_writer.writerow([
-        record["label"].encode("utf-8"),
-        record["utility"].encode("utf-8"),
-        record["eiaid"] if "eiaid" in record.keys() else None,
-        record["name"].encode("utf-8"),
-        record["description"].encode("utf-8")
-        if "description" in record.keys() else None,
-        record["enddate"] if "enddate" in record.keys() else None,
-        record["source"].encode("utf-8")
-        if "source" in record.keys() else None,
-        record["uri"].encode("utf-8"),
-        record["fixedmonthlycharge"]
-        if "fixedmonthlycharge" in record.keys() else None,
-        calculated_annual_charging_cost,
-        calculated_annual_charging_kwh,
-        "yes" if ev_specific_rate else "no"
-    ]
-    )
+    return tuple(record.get(field) for field in CHARGING_COST_RECORD_FIELDS) \
+        + (calculated_annual_charging_cost,
+           calculated_annual_charging_kwh,
+           "yes" if ev_specific_rate else "no")
 
 
-def write_filter_results(record, csv_writer, why):
+def get_filter_results_row(record, why):
     """
-    Write the reason for filtering out a record.
+    Get the filtered records results row for a record, with the reason for
+    filtering it out.
     :param record:
-    :param csv_writer:
     :param why:
     :return:
     """
-    csv_writer.writerow([
-        record["label"].encode("utf-8"),
-        record["utility"].encode("utf-8"),
-        record["eiaid"] if "eiaid" in record.keys() else None,
-        record["name"].encode("utf-8"),
-        record["description"].encode("utf-8")
-        if "description" in record.keys() else None,
-        record["enddate"] if "enddate" in record.keys() else None,
-        record["source"].encode("utf-8")
-        if "source" in record.keys() else None,
-        record["uri"].encode("utf-8"),
-        why
-    ]
-    )
+    return tuple(record.get(field) for field in FILTERED_RECORD_FIELDS) \
+        + (why,)
 
 
 if __name__ == "__main__":
-    # Create an in-memory database where we'll load the input files
-    db = sqlite3.connect(":memory:")
-
     # Get the params for the download request
     request_params = get_request_params()
 
@@ -214,80 +238,102 @@ if __name__ == "__main__":
         charging_weekday_profile, charging_weekend_profile = \
         get_profile_inputs()
 
+    # Charging profile annual kWh (the same for every record)
+    annual_charging_kwh = calculate_annual_charging_kwh(
+        charging_weekday_profile=charging_weekday_profile,
+        charging_weekend_profile=charging_weekend_profile
+    )
+
+    # Records are independent of each other, so we calculate their
+    # charging cost in worker processes
+    calculate_charging_cost_with_profiles = partial(
+        calculate_charging_cost,
+        baseline_weekday_profile=baseline_weekday_profile,
+        baseline_weekend_profile=baseline_weekend_profile,
+        charging_weekday_profile=charging_weekday_profile,
+        charging_weekend_profile=charging_weekend_profile
+    )
+
     # Start with no offset (first record)
     offset = 0
-    remaining_records = True
 
     # Create the results directory if it doesn't exist
-    if not os.path.exists(os.path.join(os.getcwd(), "results")):
-        os.makedirs(os.path.join(os.getcwd(), "results"))
+    if not os.path.exists(RESULTS_DIRECTORY):
+        os.makedirs(RESULTS_DIRECTORY)
 
     # Write results files headers
     write_results_files_headers()
 
     # Download record, calculate cost, and write to results file
-    while remaining_records is True:
-        request_params["offset"] = offset
-        requested_records = request_records(request_params=request_params)
+    with Pool() as pool, \
+            ThreadPoolExecutor(max_workers=1) as downloader, \
+            open(FILTERED_RECORDS_RESULTS_FILE, "a", newline="",
+                 encoding="utf-8") as filter_results_file, \
+            open(CHARGING_COST_RESULTS_FILE, "a", newline="",
+                 encoding="utf-8") as charging_results_file:
+        filter_writer = csv.writer(filter_results_file, delimiter=",")
+        charging_writer = csv.writer(charging_results_file, delimiter=",")
+
+        # Pages are downloaded in the background: we request the next page
+        # before processing the current one
+        next_page = downloader.submit(
+            request_records, request_params=dict(request_params, offset=offset)
+        )
+
+        while True:
+            items = next_page.result()["items"]
 
-        remaining_records = \
-            False if len(requested_records["items"]) == 0 else True
+            # No more records
+            if not items:
+                break
+
+            next_page = downloader.submit(
+                request_records,
+                request_params=dict(request_params, offset=offset + len(items))
+            )
 
-        if remaining_records is True:
             print("Processing records {}-{} of ~10,200...".format(
-                offset + 1, offset + len(requested_records["items"]))
+                offset + 1, offset + len(items))
             )
-            for r in requested_records["items"]:
-                if filter_record(record=r)[0]:
-
-                    reason = filter_record(record=r)[1]
-                    with open(os.path.join(
-                            os.getcwd(), "results", "filtered_records.csv"
-                    ), "a", newline="") as filter_results_file:
-                        writer = csv.writer(filter_results_file, delimiter=",")
-                        write_filter_results(
-                            record=r,
-                            csv_writer=writer,
-                            why=reason
-                        )
+
+            # Results rows are collected for the whole page and written
+            # at once
+            filtered_batch = list()
+            cost_batch = list()
+
+            records_to_process = list()
+            for r in items:
+                is_filtered, reason = filter_record(record=r)
+                if is_filtered:
+                    filtered_batch.append(
+                        get_filter_results_row(record=r, why=reason)
+                    )
                 else:
-                    # Is this is an EV-specific rate
-                    ev_specific = \
-                        True if "EV" in r["name"] \
-                                or "electric vehicle" in r["name"].lower() \
-                        else False
-
-                    # Calculate charging cost
-                    annual_charging_cost = process_record(
-                        record=r, db=db,
-                        baseline_weekday_profile=baseline_weekday_profile,
-                        baseline_weekend_profile=baseline_weekend_profile,
-                        charging_weekday_profile=charging_weekday_profile,
-                        charging_weekend_profile=charging_weekend_profile,
-                        ev_specific=ev_specific
+                    records_to_process.append(r)
+
+            # Calculate charging cost; imap returns the results in the
+            # same order as the records
+            charging_costs = pool.imap(
+                calculate_charging_cost_with_profiles,
+                records_to_process,
+                chunksize=32
+            )
+
+            for r, (ev_specific, annual_charging_cost) in \
+                    zip(records_to_process, charging_costs):
+                cost_batch.append(
+                    get_charging_cost_results_row(
+                        record=r,
+                        calculated_annual_charging_cost=annual_charging_cost,
+                        calculated_annual_charging_kwh=annual_charging_kwh,
+                        ev_specific_rate=ev_specific
                     )
+                )
+
+            # Write results
+            filter_writer.writerows(filtered_batch)
+            charging_writer.writerows(cost_batch)
 
-                    # Charging profile annual kWh
-                    annual_charging_kwh = calculate_annual_charging_kwh(
-                        database=db)
-
-                    # Write results
-                    with open(os.path.join(
-                            os.getcwd(), "results",
-                            "ev_charging_cost_by_utility_rate.csv"
-                    ), "a", newline="") as charging_results_file:
-                        writer = csv.writer(
-                            charging_results_file, delimiter=","
-                        )
-                        write_charging_cost_results(
-                            record=r,
-                            calculated_annual_charging_cost=
-                            annual_charging_cost,
-                            calculated_annual_charging_kwh=annual_charging_kwh,
-                            ev_specific_rate=ev_specific,
-                            csv_writer=writer
-                        )
-
-        offset += len(requested_records["items"])
+            offset += len(items)
 
     print("Done.")